@@ -0,0 +1,104 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it these run as plain Python loops.
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+# ----------------------- Recursive Indicators -----------------------
+@njit(cache=True)
+def _ema(values, alpha, min_periods):
+    # Same recursion as pandas ewm(adjust=False), seeded on the first value.
+    out = np.full(len(values), np.nan)
+    if len(values) == 0:
+        return out
+    acc = values[0]
+    for i in range(len(values)):
+        acc = alpha * values[i] + (1 - alpha) * acc
+        if i + 1 >= min_periods:
+            out[i] = acc
+    return out
+
+
+@njit(cache=True)
+def _wilder_rsi(close, n):
+    out = np.full(len(close), np.nan)
+    alpha = 1.0 / n
+    avg_up = 0.0
+    avg_down = 0.0
+    for i in range(1, len(close)):
+        change = close[i] - close[i - 1]
+        up = change if change > 0 else 0.0
+        down = -change if change < 0 else 0.0
+        avg_up = alpha * up + (1 - alpha) * avg_up
+        avg_down = alpha * down + (1 - alpha) * avg_down
+        if i + 1 >= n:
+            out[i] = 100.0 if avg_down == 0 else 100 - 100 / (1 + avg_up / avg_down)
+    return out
+
+
+@njit(cache=True)
+def _macd(close, fast, slow):
+    return _ema(close, 2.0 / (fast + 1), fast) - _ema(close, 2.0 / (slow + 1), slow)
+
+
+@njit(cache=True)
+def _true_range(high, low, prev_close):
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+@njit(cache=True)
+def _atr(high, low, close, n):
+    out = np.full(len(close), np.nan)
+    if len(close) < n:
+        return out
+    total = high[0] - low[0]
+    for i in range(1, n):
+        total += _true_range(high[i], low[i], close[i - 1])
+    out[n - 1] = total / n
+    for i in range(n, len(close)):
+        out[i] = (out[i - 1] * (n - 1) + _true_range(high[i], low[i], close[i - 1])) / n
+    return out
+
+
+# ----------------------- Rolling Statistics -----------------------
+@njit(cache=True)
+def _rolling_zscore(values, n):
+    # One pass: Welford warm-up, then a sliding update of the window mean and M2 (ddof=1).
+    # Like pandas, runs of identical values are tracked so a flat window is NaN rather than
+    # rounding residue left in M2 blowing up into a huge z-score.
+    out = np.full(len(values), np.nan)
+    if len(values) < n:
+        return out
+    mean = 0.0
+    m2 = 0.0
+    run = 0
+    for i in range(n):
+        run = run + 1 if i > 0 and values[i] == values[i - 1] else 1
+        delta = values[i] - mean
+        mean += delta / (i + 1)
+        m2 += delta * (values[i] - mean)
+    if run >= n:
+        mean = values[n - 1]
+        m2 = 0.0
+    elif m2 > 0:
+        out[n - 1] = (values[n - 1] - mean) / np.sqrt(m2 / (n - 1))
+    for i in range(n, len(values)):
+        old = values[i - n]
+        new = values[i]
+        run = run + 1 if new == values[i - 1] else 1
+        if run >= n:
+            mean = new
+            m2 = 0.0
+            continue
+        new_mean = mean + (new - old) / n
+        m2 += (new - old) * (new - new_mean + old - mean)
+        mean = new_mean
+        if m2 > 0:
+            out[i] = (new - mean) / np.sqrt(m2 / (n - 1))
+    return out
@@ -1,58 +1,136 @@
 from binance.client import Client
+from binance import ThreadedWebsocketManager
 import os
+import sys
 import time
-import pandas as pd
+import logging
+import threading
+import polars as pl
 import numpy as np
 from dotenv import load_dotenv
-from sklearn.ensemble import RandomForestClassifier
-from datetime import datetime
+from lightgbm import LGBMClassifier
+from concurrent.futures import ThreadPoolExecutor
 import joblib
-import ta
+from _indicators_njit import _wilder_rsi, _macd, _atr, _rolling_zscore
+
+try:
+    import onnxruntime as ort
+    from onnxmltools import convert_lightgbm
+    from onnxmltools.convert.common.data_types import FloatTensorType
+except ImportError:
+    ort = None  # ONNX export/inference is optional; predict() falls back to LightGBM's own predictor.
 
 # ----------------------- Binance Client -----------------------
+STREAM_MAX_AGE = 30  # seconds before a silent websocket falls back to REST
+
 class BinanceUSClient:
-    def __init__(self):
+    def __init__(self, symbol="BTCUSDT"):
         load_dotenv()
         self.api_key = os.getenv("API_KEY")
         self.secret_key = os.getenv("SECRET_KEY")
         self.client = Client(self.api_key, self.secret_key, tld='us')
 
+        # Live price and book depth are pushed over websockets; main() reads the cached snapshot.
+        self.symbol = symbol
+        self._lock = threading.Lock()
+        self._last_price = None
+        self._bid_vol = None
+        self._ask_vol = None
+        self._price_updated = 0.0
+        self._depth_updated = 0.0
+        self._klines_df = None
+        self._klines_key = None
+        self._klines_rows = 0
+        self.twm = ThreadedWebsocketManager(self.api_key, self.secret_key, tld='us')
+        self.twm.start()
+        self.twm.start_symbol_book_ticker_socket(callback=self._on_bt, symbol=symbol)
+        self.twm.start_depth_socket(callback=self._on_depth, symbol=symbol, depth='20')
+
+    def close(self):
+        # The websocket manager is a non-daemon thread; without this the process outlives main().
+        self.twm.stop()
+
+    def _on_bt(self, msg):
+        if 'b' not in msg or 'a' not in msg:
+            return
+        price = (float(msg['b']) + float(msg['a'])) / 2
+        with self._lock:
+            self._last_price = price
+            self._price_updated = time.monotonic()
+
+    def _on_depth(self, msg):
+        if 'bids' not in msg or 'asks' not in msg:
+            return
+        bid_volume = sum(float(bid[1]) for bid in msg['bids'])
+        ask_volume = sum(float(ask[1]) for ask in msg['asks'])
+        with self._lock:
+            self._bid_vol = bid_volume
+            self._ask_vol = ask_volume
+            self._depth_updated = time.monotonic()
+
+    def _is_fresh(self, updated_at):
+        return time.monotonic() - updated_at < STREAM_MAX_AGE
+
     def get_price(self, symbol="BTCUSDT"):
-        tickers = self.client.get_all_tickers()
-        for ticker in tickers:
-            if ticker["symbol"] == symbol:
-                return float(ticker["price"])
-        return None
+        if symbol == self.symbol:
+            with self._lock:
+                if self._last_price is not None and self._is_fresh(self._price_updated):
+                    return self._last_price
+        return float(self.client.get_symbol_ticker(symbol=symbol)["price"])
 
     def get_usdt_balance(self):
         balance = self.client.get_asset_balance(asset='USDT')
         return float(balance['free']) if balance else 0.0
 
     def get_order_book_stats(self, symbol="BTCUSDT"):
+        if symbol == self.symbol:
+            with self._lock:
+                if self._bid_vol is not None and self._is_fresh(self._depth_updated):
+                    return self._bid_vol, self._ask_vol
         depth = self.client.get_order_book(symbol=symbol)
         bid_volume = sum(float(bid[1]) for bid in depth['bids'])
         ask_volume = sum(float(ask[1]) for ask in depth['asks'])
         return bid_volume, ask_volume
 
     def get_historical_data(self, symbol="BTCUSDT", interval=Client.KLINE_INTERVAL_5MINUTE, lookback="3 day ago UTC"):
-        klines = self.client.get_historical_klines(symbol, interval, lookback)
-        df = pd.DataFrame(klines, columns=[
-            "timestamp", "open", "high", "low", "close", "volume",
-            "close_time", "quote_asset_volume", "number_of_trades",
-            "taker_buy_base_volume", "taker_buy_quote_volume", "ignore"
-        ])
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit='ms')
-        df.set_index("timestamp", inplace=True)
-        df = df.astype(float)
-        return df
+        key = (symbol, interval, lookback)
+        if self._klines_df is None or self._klines_key != key:
+            klines = self.client.get_historical_klines(symbol, interval, lookback)
+            self._klines_df = self._klines_to_df(klines)
+            self._klines_key = key
+            self._klines_rows = len(self._klines_df)
+        else:
+            # Refetch from the last cached bar so the still-forming candle is refreshed, then append.
+            start = self._klines_df["timestamp"].dt.epoch("ms")[-1]
+            new = self._klines_to_df(self.client.get_historical_klines(symbol, interval, start))
+            df = pl.concat([self._klines_df, new]).unique(subset="timestamp", keep="last", maintain_order=True)
+            self._klines_df = df.tail(self._klines_rows)
+        return self._klines_df
+
+    def _klines_to_df(self, klines):
+        # Only the OHLCV fields are used downstream; the remaining kline fields are never parsed.
+        df = pl.DataFrame(
+            [kline[:6] for kline in klines],
+            schema={"timestamp": pl.Int64, "open": pl.Utf8, "high": pl.Utf8,
+                    "low": pl.Utf8, "close": pl.Utf8, "volume": pl.Utf8},
+            orient="row"
+        )
+        return df.with_columns(
+            pl.from_epoch("timestamp", time_unit="ms"),
+            pl.col("open", "high", "low", "close", "volume").cast(pl.Float64)
+        )
 
 # ----------------------- Logger -----------------------
+logger = logging.getLogger("one_agg")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_format = logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+for _handler in (logging.StreamHandler(sys.stdout), logging.FileHandler("onE_log_aggressive.txt", encoding="utf-8")):
+    _handler.setFormatter(_log_format)
+    logger.addHandler(_handler)
+
 def log(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    full_message = f"[{timestamp}] {message}"
-    print(full_message)
-    with open("onE_log_aggressive.txt", "a") as file:
-        file.write(full_message + "\n")
+    logger.info(message)
 
 # ----------------------- Position Manager -----------------------
 class PositionManager:
@@ -89,82 +167,162 @@ class PositionManager:
         self.quantity = None
 
 # ----------------------- Indicators & Features -----------------------
+WARMUP_BARS = 50
+FEATURES = ['SMA_20', 'SMA_50', 'RSI', 'MACD', 'BB_upper', 'BB_lower', 'ATR', 'Stoch_K', 'Stoch_D', 'VWAP', 'OBI', 'volume_zscore']
+
 def calculate_indicators(df, bid_volume, ask_volume):
-    df['SMA_20'] = ta.trend.sma_indicator(df['close'], window=20)
-    df['SMA_50'] = ta.trend.sma_indicator(df['close'], window=50)
-    df['RSI'] = ta.momentum.RSIIndicator(df['close']).rsi()
-    df['MACD'] = ta.trend.MACD(df['close']).macd()
-    bb = ta.volatility.BollingerBands(df['close'])
-    df['BB_upper'] = bb.bollinger_hband()
-    df['BB_lower'] = bb.bollinger_lband()
-    df['ATR'] = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close']).average_true_range()
-    stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'])
-    df['Stoch_K'] = stoch.stoch()
-    df['Stoch_D'] = stoch.stoch_signal()
-    df['VWAP'] = (df['volume'] * (df['high'] + df['low'] + df['close']) / 3).cumsum() / df['volume'].cumsum()
-    df['OBI'] = (bid_volume - ask_volume) / (bid_volume + ask_volume)
-    df['volume_zscore'] = (df['volume'] - df['volume'].rolling(20).mean()) / df['volume'].rolling(20).std()
-    return df.dropna()
+    close = df['close'].to_numpy()
+    high = df['high'].to_numpy()
+    low = df['low'].to_numpy()
+    volume = df['volume'].to_numpy()
+
+    sma_20 = pl.col('close').rolling_mean(20)
+    bb_std = pl.col('close').rolling_std(20, ddof=0)
+    lowest = pl.col('low').rolling_min(14)
+    highest = pl.col('high').rolling_max(14)
+    stoch_k = 100 * (pl.col('close') - lowest) / (highest - lowest)
+    typical_price = (pl.col('high') + pl.col('low') + pl.col('close')) / 3
+
+    # Window ops run as Polars expressions; the recursive ones come from the numba kernels.
+    df = df.with_columns(
+        sma_20.alias('SMA_20'),
+        pl.col('close').rolling_mean(50).alias('SMA_50'),
+        pl.Series('RSI', _wilder_rsi(close, 14)),
+        pl.Series('MACD', _macd(close, 12, 26)),
+        (sma_20 + 2 * bb_std).alias('BB_upper'),
+        (sma_20 - 2 * bb_std).alias('BB_lower'),
+        pl.Series('ATR', _atr(high, low, close, 14)),
+        stoch_k.alias('Stoch_K'),
+        stoch_k.rolling_mean(3).alias('Stoch_D'),
+        ((pl.col('volume') * typical_price).cum_sum() / pl.col('volume').cum_sum()).alias('VWAP'),
+        pl.lit((bid_volume - ask_volume) / (bid_volume + ask_volume)).alias('OBI'),
+        pl.Series('volume_zscore', _rolling_zscore(volume, 20)),
+    )
+    # float32 is plenty for tree split thresholds.
+    df = df.with_columns(pl.col(FEATURES).cast(pl.Float32))
+    # Warm-up nulls end where the longest window (SMA_50) first fills.
+    return df.slice(WARMUP_BARS - 1)
 
 # ----------------------- Target Labeling -----------------------
 def add_target(df, horizon=3):
-    df['future_return'] = df['close'].shift(-horizon) / df['close'] - 1
-    df['target'] = 0
-    df.loc[df['future_return'] > 0.002, 'target'] = 1
-    df.loc[df['future_return'] < -0.002, 'target'] = -1
-    return df.dropna()
+    future_return = pl.col('close').shift(-horizon) / pl.col('close') - 1
+    df = df.with_columns(future_return.alias('future_return'))
+    df = df.with_columns(
+        pl.when(pl.col('future_return') > 0.002).then(1)
+        .when(pl.col('future_return') < -0.002).then(-1)
+        .otherwise(0)
+        .alias('target')
+    )
+    return df.head(-horizon)
 
 # ----------------------- Model Training -----------------------
-def train_or_load_model(df, model_path='model_aggressive.pkl'):
-    features = ['SMA_20', 'SMA_50', 'RSI', 'MACD', 'BB_upper', 'BB_lower', 'ATR', 'Stoch_K', 'Stoch_D', 'VWAP', 'OBI', 'volume_zscore']
-    if os.path.exists(model_path):
+MODEL_PATH = 'model_aggressive.pkl'
+ONNX_PATH = 'model_aggressive.onnx'
+RETRAIN_INTERVAL = 6 * 60 * 60  # seconds
+
+def model_is_stale(model_path=MODEL_PATH):
+    return not os.path.exists(model_path) or time.time() - os.path.getmtime(model_path) >= RETRAIN_INTERVAL
+
+def train_or_load_model(df, model_path=MODEL_PATH):
+    if not model_is_stale(model_path):
         return joblib.load(model_path)
-    X = df[features]
-    y = df['target']
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    X = df.select(FEATURES).to_numpy()
+    y = df['target'].to_numpy()
+    model = LGBMClassifier(n_estimators=64, num_leaves=31, learning_rate=0.1, n_jobs=-1, random_state=42, verbose=-1)
     model.fit(X, y)
     joblib.dump(model, model_path)
+    if ort is not None:
+        export_onnx(model)
     return model
 
+def export_onnx(model, onnx_path=ONNX_PATH):
+    onx = convert_lightgbm(
+        model,
+        initial_types=[('f', FloatTensorType([None, len(FEATURES)]))],
+        zipmap=False
+    )
+    with open(onnx_path, 'wb') as file:
+        file.write(onx.SerializeToString())
+
+def load_onnx_session(onnx_path=ONNX_PATH, model_path=MODEL_PATH):
+    # An export older than the pickle belongs to a previous model.
+    if ort is None or not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(model_path):
+        return None
+    return ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+
 # ----------------------- Prediction -----------------------
-def predict(df, model):
-    features = ['SMA_20', 'SMA_50', 'RSI', 'MACD', 'BB_upper', 'BB_lower', 'ATR', 'Stoch_K', 'Stoch_D', 'VWAP', 'OBI', 'volume_zscore']
-    latest = df.iloc[-1][features].values.reshape(1, -1)
-    proba = model.predict_proba(latest)[0]
-    pred = model.predict(latest)[0]
-    return pred, max(proba)
+SIGNAL_BARS = 3
+PRED_CACHE_SIZE = 2
+_pred_cache = {}  # bar timestamp -> (prediction, confidence)
+
+def predict(df, model, onnx_session=None):
+    key = df['timestamp'][-1]
+    if key in _pred_cache:
+        return _pred_cache[key]
+    recent = df.select(FEATURES).tail(SIGNAL_BARS).to_numpy()
+    if np.isnan(recent).any():
+        # Flat high/low or zero volume can leave NaN features past the warm-up; never trade on them.
+        log("⚠️ NaN in recent features. Holding.")
+        _pred_cache[key] = (0, 0.0)
+    else:
+        if onnx_session is not None:
+            # Fetch only the probabilities; the converted 'label' output is declared with a fixed shape of 1.
+            proba = onnx_session.run(['probabilities'], {'f': recent})[0]
+        else:
+            proba = model.predict_proba(recent)
+        preds = model.classes_[proba.argmax(axis=1)]
+        # Only act when the last SIGNAL_BARS bars agree; otherwise hold.
+        pred = preds[-1] if (preds == preds[-1]).all() else 0
+        _pred_cache[key] = (pred, proba[-1].max())
+    while len(_pred_cache) > PRED_CACHE_SIZE:
+        del _pred_cache[next(iter(_pred_cache))]
+    return _pred_cache[key]
 
 # ----------------------- Trading Logic -----------------------
 position = PositionManager()
 client = BinanceUSClient()
+io_pool = ThreadPoolExecutor(max_workers=2)
 CONFIDENCE_THRESHOLD = 0.6
+LOOP_INTERVAL = 60  # seconds
+COOLDOWN_TOLERANCE = 1  # seconds
 
 last_trade_time = None
+model = None
+onnx_session = None
 
 def can_trade():
     global last_trade_time
-    if not last_trade_time or (datetime.now() - last_trade_time).seconds > 60:
-        last_trade_time = datetime.now()
+    now = time.monotonic()
+    # run_forever ticks on an exact LOOP_INTERVAL grid; the tolerance absorbs scheduler jitter.
+    if last_trade_time is None or now - last_trade_time >= LOOP_INTERVAL - COOLDOWN_TOLERANCE:
+        last_trade_time = now
         return True
     return False
 
 def main():
+    global model, onnx_session
     log("\U0001f501 Running Project onE (Aggressive Mode)...")
     if not can_trade():
         log("⏳ Trade cooldown active. Skipping.")
         return
 
+    # Balance and klines are REST round-trips; overlap them with each other and with the price/depth reads.
+    balance_future = io_pool.submit(client.get_usdt_balance)
+    klines_future = io_pool.submit(client.get_historical_data)
     live_price = client.get_price()
-    usdt_balance = client.get_usdt_balance()
     bid_volume, ask_volume = client.get_order_book_stats()
+    usdt_balance = balance_future.result()
     log(f"💰 USDT Balance: ${usdt_balance:.2f} | OBI: {(bid_volume - ask_volume) / (bid_volume + ask_volume):.4f}")
 
-    df = client.get_historical_data()
+    df = klines_future.result()
     df = calculate_indicators(df, bid_volume, ask_volume)
     df = add_target(df)
-    model = train_or_load_model(df)
+    if model is None or model_is_stale():
+        model = train_or_load_model(df)
+        onnx_session = load_onnx_session()
+        _pred_cache.clear()
 
-    prediction, confidence = predict(df, model)
+    prediction, confidence = predict(df, model, onnx_session)
     log(f"Model Prediction: {prediction} | Confidence: {confidence:.2f}")
 
     if confidence < CONFIDENCE_THRESHOLD:
@@ -205,10 +363,17 @@ def main():
 
 # ----------------------- Loop -----------------------
 def run_forever():
-    while True:
-        main()
-        log("⏱ Waiting 1 minute...")
-        time.sleep(60)
+    # Sleep to a fixed monotonic grid so a slow main() doesn't push every later cycle back.
+    next_run = time.monotonic()
+    try:
+        while True:
+            main()
+            next_run = max(next_run + LOOP_INTERVAL, time.monotonic())
+            wait = max(0, next_run - time.monotonic())
+            log(f"⏱ Waiting {wait:.0f}s until next cycle...")
+            time.sleep(wait)
+    finally:
+        client.close()
 
 if __name__ == "__main__":
     run_forever()